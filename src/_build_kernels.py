@@ -0,0 +1,35 @@
+"""
+Módulo: _build_kernels.py
+Descrição: Compilação antecipada (AOT) do kernel RK4 + J2 com numba.pycc.
+
+Mesmo com cache=True, a primeira execução paga a compilação JIT do Numba, o que
+numa chamada avulsa (CLI, poucos satélites) pode custar mais que a própria
+propagação. Este script gera o módulo nativo 'orbital_native' (.so/.pyd) ao lado
+do pacote; 'runge_kutta_4' passa a usá-lo automaticamente quando ele existe e
+recorre ao JIT quando não existe.
+
+Uso (a partir da raiz do repositório):
+    python -m src._build_kernels
+
+Limitação: o pycc não suporta parallel=True, então apenas o kernel de um
+satélite ('_rk4_j2') é exportado; as versões em lote continuam via JIT.
+"""
+
+import os
+
+from numba.pycc import CC
+
+from .orbital_mechanics import _rk4_j2
+
+cc = CC('orbital_native')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@cc.export('rk4_j2', 'void(f8[:], f8, i8, f8[:, :], b1)')
+def rk4_j2(state0, dt, n, out, include_j2):
+    """Mesma assinatura de '_rk4_j2': preenche o buffer SoA (6, n + 1) 'out'."""
+    _rk4_j2(state0, dt, n, out, include_j2)
+
+
+if __name__ == '__main__':
+    cc.compile()
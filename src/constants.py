@@ -29,4 +29,12 @@ RADIUS_EARTH = 6378.137
 # Efeito Físico: É a principal causa da precessão (rotação lenta) do plano da órbita
 # e do argumento do perigeu em Órbita Baixa da Terra (LEO).
 # Sem este valor, as órbitas simuladas não sofreriam deriva realista.
-J2 = 1.08263e-3
\ No newline at end of file
+J2 = 1.08263e-3
+
+# --- CONSTANTES DERIVADAS ---
+
+# Fator constante da aceleração J2 (1.5 * J2 * mu * R_Terra^2)
+# Unidade: km^5 / s^2
+# Explicação: Parte da equação do J2 que não depende da posição do satélite.
+# Calculado uma única vez na importação; a aceleração só precisa multiplicá-lo por 1/r^5.
+K_J2_COEFF = 1.5 * J2 * GM_EARTH * RADIUS_EARTH * RADIUS_EARTH
@@ -5,11 +5,15 @@ Este módulo gerencia o download, cache, parsing e conversão dos dados orbitais
 
 Funcionalidades principais:
 1. Gerenciamento de Cache: Evita downloads repetitivos do CelesTrak.
-2. Filtragem: Converte dados para Pandas para permitir consultas (ex: "STARLINK").
+2. Filtragem: Converte dados para Pandas para permitir consultas (ex: "STARLINK"),
+   com cache em disco do resultado da filtragem.
 3. Tradução Física: Converte elementos orbitais abstratos (TLE) em vetores cartesianos (r, v).
+4. Referência em Lote: Propaga vários satélites em vários instantes com uma única chamada SGP4.
 """
 
-from skyfield.api import load, EarthSatellite
+from skyfield.api import load
+from skyfield.sgp4lib import TEME
+from sgp4.api import SatrecArray, SGP4_ERRORS, jday
 import numpy as np
 import pandas as pd
 import os
@@ -21,17 +25,50 @@ def satellites_to_dataframe(satellites):
     
     Motivo: Listas nativas do Python são lentas para buscas de texto. 
     O Pandas permite filtrar milhares de satélites por nome em milissegundos.
+    
+    O DataFrame é montado a partir de colunas já tipadas (dicionário de arrays),
+    evitando que o Pandas infira os tipos linha a linha a partir de dicionários.
     """
-    data = []
-    for sat in satellites:
-        data.append({
-            'name': sat.name,                 # Nome do Satélite (ex: STARLINK-1007)
-            'catalog_number': sat.model.satnum, # ID NORAD único
-            'epoch': sat.epoch.utc_datetime(),  # Data de referência do TLE
-            'object': sat                     # O objeto Skyfield real (guardado para cálculos físicos)
-        })
+    n = len(satellites)
+    names = np.empty(n, dtype=object)
+    satnums = np.empty(n, dtype=np.int64)
+    epoch_days = np.empty(n)   # Época do TLE em dias desde 1970-01-01 (UTC)
+    objects = np.empty(n, dtype=object)
+
+    for i, sat in enumerate(satellites):
+        names[i] = sat.name                 # Nome do Satélite (ex: STARLINK-1007)
+        satnums[i] = sat.model.satnum       # ID NORAD único
+        # Data de referência do TLE, lida direto do modelo SGP4 (data juliana em duas partes)
+        epoch_days[i] = (sat.model.jdsatepoch - 2440587.5) + sat.model.jdsatepochF
+        objects[i] = sat                    # O objeto Skyfield real (guardado para cálculos físicos)
+
+    # Conversão vetorizada das épocas (uma única chamada para todo o catálogo)
+    epochs = pd.to_datetime(epoch_days, unit='D', utc=True).round('us').astype('datetime64[us, UTC]')
+
+    return pd.DataFrame({
+        'name': names,
+        'catalog_number': satnums,
+        'epoch': epochs,
+        'object': objects,
+    })
+
+def filter_satellites_by_prefix(df, prefix):
+    """
+    Filtra o catálogo pelo prefixo do nome do satélite (ex: "STARLINK").
+    
+    Motivo: 'str.contains' compila uma expressão regular e varre todos os nomes;
+    para constelações cujo nome começa pelo prefixo, 'str.startswith' é mais barato.
     
-    return pd.DataFrame(data)
+    Args:
+        df (pd.DataFrame): Catálogo completo gerado por 'satellites_to_dataframe'.
+        prefix (str): Prefixo do nome (comparação sem diferenciar maiúsculas).
+        
+    Returns:
+        pd.DataFrame: Linhas de 'df' cujo nome começa com 'prefix'.
+    """
+    # Filtragem sem regex (prefixo, sem diferenciar maiúsculas/minúsculas)
+    mask = df['name'].str.upper().str.startswith(prefix.upper())
+    return df[mask]
 
 def load_tles_smart(url='https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle', 
                     filename='active_satellites.txt', 
@@ -135,4 +172,64 @@ def get_initial_state_and_time(satellite, ts, time_offset_seconds=0):
     # 4. Unificação no Vetor de Estado (State Vector) de 6 elementos
     state_initial = np.hstack((r_vector, v_vector))
 
-    return t0, state_initial
\ No newline at end of file
+    return t0, state_initial
+
+
+def get_sgp4_states_batch(satellites, t, frame='gcrs'):
+    """
+    Calcula a posição/velocidade de referência (SGP4) de vários satélites em vários instantes.
+    
+    Equivale a chamar 'satellite.at(t)' para cada satélite, mas todos os pares
+    (satélite, instante) são resolvidos em uma única chamada ao núcleo em C do
+    SGP4 ('SatrecArray'), sem criar objetos do Skyfield por satélite.
+    
+    Args:
+        satellites (list): Lista de objetos EarthSatellite.
+        t (Time): Instantes de consulta (objeto Time do Skyfield em formato de array).
+        frame (str, opcional): 'gcrs' (padrão, o mesmo referencial de 'satellite.at()')
+            ou 'teme', o referencial nativo do SGP4. Em 'teme' a rotação por instante
+            (precessão/nutação) é dispensada; serve quando o estado só é comparado com
+            outro no mesmo referencial (ex.: o integrador numérico partindo dele).
+        
+    Returns:
+        tuple: (r, v) -> Arrays C-contíguos (N_satélites, N_instantes, 3) em km e km/s,
+        no referencial pedido. Instantes em que o SGP4 falha para um satélite ficam
+        preenchidos com NaN, e o nome do satélite e o motivo da falha são avisados.
+    """
+    if frame not in ('gcrs', 'teme'):
+        raise ValueError(f"Referencial desconhecido: '{frame}' (use 'gcrs' ou 'teme')")
+
+    sat_array = SatrecArray([sat.model for sat in satellites])
+
+    # Mesma convenção de data do Skyfield: a época do TLE é interpretada em UTC.
+    # A data juliana UTC (parte inteira + fração) sai do calendário público 't.utc'
+    # via 'jday' do próprio sgp4, sem depender de API privada do Skyfield.
+    year, month, day, hour, minute, second = t.utc
+    jd, fraction = jday(year, month, day, hour, minute, second)
+    jd = np.asarray(jd, dtype=np.float64)
+    fraction = np.asarray(fraction, dtype=np.float64)
+
+    # Uma única chamada em C para todos os satélites e instantes (TEME, km e km/s)
+    errors, r_teme, v_teme = sat_array.sgp4(jd, fraction)
+
+    # Códigos de erro do SGP4 (0 = sucesso), um por par (satélite, instante). TLEs
+    # antigos propagados até a época comum da frota podem falhar (ex.: satélite que
+    # já reentrou); os vetores desses pares vêm como NaN.
+    for i in np.flatnonzero(errors.any(axis=1)):
+        codes = errors[i]
+        code = int(codes[codes != 0][0])
+        print(f"AVISO: SGP4 falhou para {satellites[i].name} em {np.count_nonzero(codes)} "
+              f"instante(s): {SGP4_ERRORS.get(code, f'erro {code}')}")
+
+    if frame == 'teme':
+        return np.ascontiguousarray(r_teme), np.ascontiguousarray(v_teme)
+
+    # Rotação TEME -> GCRS para cada instante (a matriz do Skyfield é GCRS -> TEME,
+    # por isso aplicamos a transposta: índices 'ji' no lugar de 'ij')
+    rotation = TEME.rotation_at(t)
+    r_gcrs = np.einsum('jim,nmj->nmi', rotation, r_teme)
+    v_gcrs = np.einsum('jim,nmj->nmi', rotation, v_teme)
+
+    # Garante o layout contíguo (trajetória de cada satélite em um bloco de memória);
+    # não copia nada quando o einsum já entrega o array nesse layout.
+    return np.ascontiguousarray(r_gcrs), np.ascontiguousarray(v_gcrs)
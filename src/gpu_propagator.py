@@ -0,0 +1,137 @@
+"""
+Módulo: gpu_propagator.py
+Descrição: Versão CUDA (GPU) do propagador RK4 + J2 em lote.
+
+A integração de cada satélite é independente das demais, o que torna o problema
+"embaraçosamente paralelo": cada thread da GPU cuida de um satélite, mantém seus
+6 componentes de estado em registradores e executa todos os estágios do RK4 sem
+tocar na memória global, que só é lida no início e escrita no fim.
+
+A física é a mesma da seção 4 de orbital_mechanics.py, reescrita como funções de
+dispositivo CUDA. Requer uma GPU NVIDIA com CUDA: verifique 'gpu_available()'
+antes de usar (a demo recorre ao kernel de CPU quando não há GPU).
+"""
+
+from math import sqrt
+
+from numba import cuda
+from .constants import GM_EARTH, K_J2_COEFF
+
+# Threads por bloco na grade de execução (múltiplo de 32, o tamanho de um warp)
+THREADS_PER_BLOCK = 128
+
+
+# ==============================================================================
+# 1. FUNÇÕES DE DISPOSITIVO (FÍSICA)
+# ==============================================================================
+
+@cuda.jit(device=True)
+def _acceleration_j2_device(x, y, z):
+    """Aceleração Kepler + J2 em aritmética escalar (executa na GPU)."""
+    r2 = x * x + y * y + z * z
+    r_norm = sqrt(r2)
+    inv_r2 = 1.0 / r2
+    inv_r3 = inv_r2 / r_norm
+
+    k_kepler = -GM_EARTH * inv_r3
+    k_j2 = K_J2_COEFF * inv_r3 * inv_r2
+    z2_over_r2 = z * z * inv_r2
+    m1 = 5.0 * z2_over_r2 - 1.0
+    m3 = 5.0 * z2_over_r2 - 3.0
+
+    ax = k_kepler * x + k_j2 * x * m1
+    ay = k_kepler * y + k_j2 * y * m1
+    az = k_kepler * z + k_j2 * z * m3
+    return ax, ay, az
+
+
+@cuda.jit(device=True)
+def _rk4_step_device(rx, ry, rz, vx, vy, vz, dt):
+    """Um passo RK4 de um satélite, com o estado em registradores (executa na GPU)."""
+    half_dt = 0.5 * dt
+
+    a1x, a1y, a1z = _acceleration_j2_device(rx, ry, rz)
+
+    v2x = vx + half_dt * a1x
+    v2y = vy + half_dt * a1y
+    v2z = vz + half_dt * a1z
+    a2x, a2y, a2z = _acceleration_j2_device(rx + half_dt * vx, ry + half_dt * vy, rz + half_dt * vz)
+
+    v3x = vx + half_dt * a2x
+    v3y = vy + half_dt * a2y
+    v3z = vz + half_dt * a2z
+    a3x, a3y, a3z = _acceleration_j2_device(rx + half_dt * v2x, ry + half_dt * v2y, rz + half_dt * v2z)
+
+    v4x = vx + dt * a3x
+    v4y = vy + dt * a3y
+    v4z = vz + dt * a3z
+    a4x, a4y, a4z = _acceleration_j2_device(rx + dt * v3x, ry + dt * v3y, rz + dt * v3z)
+
+    w = dt / 6.0
+    rx = rx + w * (vx + 2.0 * v2x + 2.0 * v3x + v4x)
+    ry = ry + w * (vy + 2.0 * v2y + 2.0 * v3y + v4y)
+    rz = rz + w * (vz + 2.0 * v2z + 2.0 * v3z + v4z)
+    vx = vx + w * (a1x + 2.0 * a2x + 2.0 * a3x + a4x)
+    vy = vy + w * (a1y + 2.0 * a2y + 2.0 * a3y + a4y)
+    vz = vz + w * (a1z + 2.0 * a2z + 2.0 * a3z + a4z)
+    return rx, ry, rz, vx, vy, vz
+
+
+# ==============================================================================
+# 2. KERNEL E INTERFACE
+# ==============================================================================
+
+@cuda.jit
+def rk4_cuda(states, dt, n_steps):
+    """
+    Kernel CUDA: avança cada linha de 'states' (uma thread por satélite) por 'n_steps' passos.
+
+    Args:
+        states (DeviceNDArray): Matriz (N, 6) residente na GPU, modificada in-place.
+        dt (float): Passo de tempo da integração (segundos).
+        n_steps (int): Quantidade de passos a avançar.
+    """
+    i = cuda.grid(1)
+    if i >= states.shape[0]:
+        return
+
+    rx = states[i, 0]
+    ry = states[i, 1]
+    rz = states[i, 2]
+    vx = states[i, 3]
+    vy = states[i, 4]
+    vz = states[i, 5]
+
+    for _ in range(n_steps):
+        rx, ry, rz, vx, vy, vz = _rk4_step_device(rx, ry, rz, vx, vy, vz, dt)
+
+    states[i, 0] = rx
+    states[i, 1] = ry
+    states[i, 2] = rz
+    states[i, 3] = vx
+    states[i, 4] = vy
+    states[i, 5] = vz
+
+
+def gpu_available():
+    """Indica se há uma GPU CUDA utilizável nesta máquina."""
+    return cuda.is_available()
+
+
+def rk4_step_gpu(d_states, dt, n_steps):
+    """
+    Equivalente em GPU de 'rk4_step_batch': lança o kernel com uma thread por satélite.
+
+    Args:
+        d_states (DeviceNDArray): Estado (N, 6) já copiado para a GPU (cuda.to_device).
+            Deve permanecer na GPU entre frames; só as posições precisam voltar
+            para a CPU quando forem desenhadas.
+        dt (float): Passo de tempo da integração (segundos).
+        n_steps (int): Quantidade de passos a avançar.
+
+    Returns:
+        DeviceNDArray: O próprio 'd_states', já atualizado.
+    """
+    blocks = (d_states.shape[0] + THREADS_PER_BLOCK - 1) // THREADS_PER_BLOCK
+    rk4_cuda[blocks, THREADS_PER_BLOCK](d_states, dt, n_steps)
+    return d_states
@@ -10,141 +10,837 @@ Modelos Físicos:
 
 Método Numérico:
 - Runge-Kutta de 4ª Ordem (RK4).
+- Versão compilada (Numba) do RK4 em lote, para propagar frotas inteiras.
+- Dormand-Prince 5(4) com passo adaptativo por satélite (versão compilada em lote),
+  com saída densa de 5ª ordem para gravar o histórico numa grade de tempo fixa.
 """
 
+from math import isfinite, sqrt
+
 import numpy as np
-from .constants import GM_EARTH, RADIUS_EARTH, J2
+from numba import njit, prange
+from .constants import GM_EARTH, K_J2_COEFF
 
 # ==============================================================================
 # 1. CÁLCULO DE FORÇAS (MODELO FÍSICO)
 # ==============================================================================
 
-def calculate_acceleration(r_vector):
+def calculate_acceleration(r_vector, out=None):
     """
     Calcula o vetor aceleração total atuando sobre o satélite.
     Combina a gravidade central (Kepleriana) com a perturbação J2.
     
+    Aceita tanto um único vetor quanto um lote de satélites (layout SoA),
+    permitindo que toda a frota seja avaliada em uma única expressão NumPy.
+    
     Args:
-        r_vector (np.array): Vetor posição [x, y, z] em km.
+        r_vector (np.array): Vetor posição [x, y, z] em km, ou matriz (N, 3)
+            com a posição de N satélites.
+        out (np.array, opcional): Buffer pré-alocado (mesmo formato de 'r_vector')
+            onde o resultado é escrito, evitando alocar um array novo a cada chamada.
         
     Returns:
-        np.array: Vetor aceleração total [ax, ay, az] em km/s^2.
+        np.array: Aceleração total [ax, ay, az] em km/s^2, com o mesmo
+            formato da entrada ('out', quando fornecido).
     """
-    # Magnitude do vetor posição (distância até o centro da Terra)
-    r_norm = np.linalg.norm(r_vector)
-    x, y, z = r_vector
+    # --- Caminho escalar: um único vetor [x, y, z] ---
+    # Para 3 elementos, o custo de despacho das ufuncs do NumPy domina a conta.
+    # Usa o kernel escalar compilado e cacheado em disco (seção 4), que trabalha com
+    # math.sqrt e floats.
+    if r_vector.ndim == 1:
+        if out is None:
+            out = np.empty(3)
+        return _acceleration_into(r_vector, out)
+
+    # --- Caminho em lote: matriz (N, 3) ---
+    # Componentes da posição de cada satélite
+    x = r_vector[..., 0]
+    y = r_vector[..., 1]
+    z = r_vector[..., 2]
+
+    # Quadrado da distância até o centro da Terra (produto escalar r·r por satélite)
+    # As potências r^3 e r^5 são obtidas com uma raiz e multiplicações, evitando
+    # o operador '**' (que vira uma chamada pow(), bem mais cara).
+    r2 = np.einsum('...i,...i->...', r_vector, r_vector)
+    r_norm = np.sqrt(r2)
+    inv_r2 = 1.0 / r2
+    inv_r3 = inv_r2 / r_norm
 
     # --- TERMO 1: Aceleração Kepleriana (Dois Corpos) ---
     # a = - (GM / r^3) * vetor_r
     # Aponta sempre para o centro da Terra (0,0,0)
-    a_kepler = -GM_EARTH / (r_norm ** 3) * r_vector
+    k_kepler = -GM_EARTH * inv_r3
 
     # --- TERMO 2: Perturbação J2 (Achatamento da Terra) ---
     # O termo J2 corrige o fato de a Terra não ser esférica.
     # Ele introduz forças que causam a precessão da órbita.
     
     # Fator comum da equação do J2
-    # k_j2 = 1.5 * J2 * GM * R_Terra^2 / r^5
-    k_j2 = 1.5 * J2 * GM_EARTH * (RADIUS_EARTH ** 2) / (r_norm ** 5)
+    # k_j2 = 1.5 * J2 * GM * R_Terra^2 / r^5  (fator constante pré-calculado em K_J2_COEFF)
+    k_j2 = K_J2_COEFF * inv_r3 * inv_r2
 
     # Termos auxiliares para simplificar as equações vetoriais
-    z2 = z ** 2
-    r2 = r_norm ** 2
+    z2_over_r2 = z * z * inv_r2
+    m1 = 5.0 * z2_over_r2 - 1.0
+    m3 = 5.0 * z2_over_r2 - 3.0
 
-    # Componentes vetoriais da perturbação J2
-    # Estas fórmulas derivam do gradiente do potencial gravitacional com harmônicos zonais
-    ax_j2 = k_j2 * x * (5 * z2 / r2 - 1)
-    ay_j2 = k_j2 * y * (5 * z2 / r2 - 1)
-    az_j2 = k_j2 * z * (5 * z2 / r2 - 3)
+    # --- Soma dos dois termos (Princípio da Superposição) ---
+    # Os dois termos são proporcionais à própria coordenada, então são somados antes
+    # como fatores escalares por satélite (x e y compartilham o mesmo fator):
+    #   a_x = (k_kepler + k_j2 * m1) * x ;  a_z = (k_kepler + k_j2 * m3) * z
+    # Cada componente é escrita direto na saída, sem arrays (N, 3) intermediários.
+    factor_xy = k_kepler + k_j2 * m1
+    factor_z = k_kepler + k_j2 * m3
 
-    a_j2 = np.array([ax_j2, ay_j2, az_j2])
-
-    # Retorna a soma vetorial (Princípio da Superposição)
-    # Aceleração Total = Gravidade Pura + Perturbação
-    return a_kepler + a_j2
+    if out is None:
+        out = np.empty(r_vector.shape, dtype=np.result_type(r_vector, 1.0))
+    np.multiply(factor_xy, x, out=out[..., 0])
+    np.multiply(factor_xy, y, out=out[..., 1])
+    np.multiply(factor_z, z, out=out[..., 2])
+    return out
 
 
 # ==============================================================================
 # 2. DEFINIÇÃO DO SISTEMA DE EDOs
 # ==============================================================================
 
-def get_derivatives(t, state):
+def get_derivatives(t, state, out=None):
     """
     Função de derivadas do sistema (f(t, y)) para o integrador.
     Converte o estado atual em taxas de variação.
     
     Args:
         t (float): Tempo atual (não usado explicitamente pois a força é conservativa/autônoma).
-        state (np.array): Vetor de estado completo [rx, ry, rz, vx, vy, vz].
+        state (np.array): Vetor de estado completo [rx, ry, rz, vx, vy, vz], ou
+            matriz (N, 6) com o estado de N satélites (uma linha por objeto).
+        out (np.array, opcional): Buffer pré-alocado (mesmo formato de 'state') que
+            recebe as derivadas. Permite que o integrador reutilize a mesma memória
+            em todos os passos, sem alocações no laço principal.
         
     Returns:
-        np.array: Derivadas [vx, vy, vz, ax, ay, az].
+        np.array: Derivadas [vx, vy, vz, ax, ay, az], no mesmo formato de 'state'.
     """
-    # Desempacota o estado em Posição e Velocidade
-    r_vector = state[0:3]
-    v_vector = state[3:6]
+    if out is None:
+        out = np.empty(state.shape, dtype=np.result_type(state, 1.0))
 
-    # Calcula a aceleração baseada na posição atual
-    a_vector = calculate_acceleration(r_vector)
+    # --- Caminho escalar: um único estado de 6 componentes ---
+    # As 6 derivadas são escritas por um kernel compilado (seção 4), sem criar
+    # views intermediárias nem despachar ufuncs do NumPy para vetores minúsculos.
+    if state.ndim == 1:
+        return _state_derivatives(state, out)
 
-    # Monta o vetor de derivadas (dy/dt)
+    # Monta o vetor de derivadas (dy/dt) diretamente no buffer de saída
     # A derivada da Posição é a Velocidade (v)
-    # A derivada da Velocidade é a Aceleração (a)
-    derivs = np.hstack((v_vector, a_vector))
+    out[..., 0:3] = state[..., 3:6]
+
+    # A derivada da Velocidade é a Aceleração (a), calculada a partir da posição atual
+    calculate_acceleration(state[..., 0:3], out=out[..., 3:6])
 
-    return derivs
+    return out
 
 
 # ==============================================================================
 # 3. INTEGRADOR NUMÉRICO (RK4)
 # ==============================================================================
 
-def runge_kutta_4(state_initial, delta_t, num_steps):
+def runge_kutta_4(state_initial, delta_t, num_steps, include_j2=True):
     """
     Propagador Orbital utilizando o método Runge-Kutta de 4ª Ordem.
     
+    O laço de integração roda no kernel compilado '_rk4_j2' (seção 4; na versão AOT
+    quando o módulo 'orbital_native' foi gerado): cada passo é feito em aritmética
+    escalar e gravado direto no histórico pré-alocado, sem chamadas ao NumPy nem
+    arrays temporários por estágio.
+    
+    Internamente o histórico é guardado por componente (SoA, formato (6, num_steps + 1)):
+    'state_history' é apenas a view transposta desse buffer, então cada coluna
+    (ex.: state_history[:, 0], a série de rx) é um bloco contíguo na memória.
+    
     Args:
         state_initial (np.array): Estado inicial [r, v].
         delta_t (float): Passo de tempo da integração (segundos).
         num_steps (int): Quantidade de passos a simular.
+        include_j2 (bool, opcional): Se False, integra apenas o problema de dois corpos
+            (Kepler puro), útil para isolar o efeito da perturbação J2.
         
     Returns:
-        tuple: (time_series, state_history)
+        tuple: (time_series, state_history) -> 'state_history' tem formato (num_steps + 1, 6).
     """
-    num_variables = len(state_initial)
-    
     # Pré-aloca matrizes para performance (evita redimensionamento em loop)
-    state_history = np.zeros((num_steps + 1, num_variables))
-    time_series = np.zeros(num_steps + 1)
+    components = np.empty((6, num_steps + 1))
+    time_series = np.arange(num_steps + 1) * float(delta_t)
+
+    _rk4_j2_entry(np.asarray(state_initial, dtype=np.float64), float(delta_t), int(num_steps), components,
+                  bool(include_j2))
+
+    return time_series, components.T
+
+def runge_kutta_4_batch(states_initial, delta_t, num_steps, dtype=np.float64, include_j2=True):
+    """
+    Versão em lote de 'runge_kutta_4': propaga N satélites guardando o histórico de cada um.
+    
+    Os satélites são distribuídos entre os núcleos da CPU pelo kernel '_rk4_batch'.
+    O buffer interno é SoA, formato (6, N, num_steps + 1): a série de uma componente
+    da frota inteira (ex.: todos os rx) é contígua e pode ser achatada sem cópia.
+    
+    Args:
+        states_initial (np.array): Matriz (N, 6) com o estado inicial [r, v] de cada satélite.
+        delta_t (float): Passo de tempo da integração (segundos).
+        num_steps (int): Quantidade de passos a simular.
+        dtype (np.dtype, opcional): Tipo do histórico gravado. A integração é sempre em
+            FP64; com np.float32 apenas o armazenamento é arredondado (resolução melhor
+            que 1 m em km até a órbita GEO), com metade da memória.
+        include_j2 (bool, opcional): Se False, integra apenas o problema de dois corpos.
+        
+    Returns:
+        tuple: (time_series, state_history) -> 'state_history' tem formato (N, num_steps + 1, 6)
+            (view transposta do buffer SoA).
+    """
+    states_initial = np.asarray(states_initial, dtype=np.float64)
+
+    components = np.empty((6, states_initial.shape[0], num_steps + 1), dtype=dtype)
+    time_series = np.arange(num_steps + 1) * float(delta_t)
+
+    _rk4_batch(states_initial, float(delta_t), num_steps, components, bool(include_j2))
+
+    return time_series, components.transpose(1, 2, 0)
+
+# ==============================================================================
+# 4. KERNELS COMPILADOS (NUMBA)
+# ==============================================================================
+# As funções abaixo repetem a física das seções 1-3 em aritmética escalar pura
+# (sem arrays temporários), para que o Numba gere um laço nativo único.
+# Nenhum objeto do Skyfield entra aqui: apenas números, evitando o modo 'object'.
+
+# Quantidade de satélites processados por bloco nos kernels em lote. Cada bloco é a
+# unidade de trabalho entregue a uma thread: 64 estados (3 KB em FP64) cabem com folga
+# no cache L1, e frotas pequenas (N <= 64) rodam como um único bloco, sem custo de
+# distribuição entre threads.
+BATCH_BLOCK_SIZE = 64
+
+# Otimizações 'fastmath' dos kernels de histórico, exceto 'nnan' e 'ninf': com elas o
+# compilador pode assumir que NaN/inf nunca aparecem e descartar os testes de estado
+# inválido (ex.: um TLE que o SGP4 não conseguiu propagar). Esses kernels também usam
+# error_model='numpy': uma divisão por zero vira inf/NaN, como no NumPy, em vez de
+# levantar ZeroDivisionError.
+HISTORY_FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+@njit(inline='always')
+def _acceleration_j2(x, y, z):
+    """
+    Versão escalar de 'calculate_acceleration' (Kepler + J2) para uso dentro de kernels.
+    
+    Returns:
+        tuple: (ax, ay, az) em km/s^2.
+    """
+    r2 = x * x + y * y + z * z
+    r_norm = sqrt(r2)
+    inv_r2 = 1.0 / r2
+    inv_r3 = inv_r2 / r_norm
+
+    # Termo Kepleriano: -GM / r^3
+    k_kepler = -GM_EARTH * inv_r3
+
+    # Termo J2: K_J2_COEFF / r^5, com K_J2_COEFF = 1.5 * J2 * GM * R_Terra^2
+    k_j2 = K_J2_COEFF * inv_r3 * inv_r2
+    z2_over_r2 = z * z * inv_r2
+    m1 = 5.0 * z2_over_r2 - 1.0
+    m3 = 5.0 * z2_over_r2 - 3.0
+
+    ax = k_kepler * x + k_j2 * x * m1
+    ay = k_kepler * y + k_j2 * y * m1
+    az = k_kepler * z + k_j2 * z * m3
+    return ax, ay, az
+
+
+@njit(inline='always')
+def _acceleration(x, y, z, include_j2):
+    """
+    Aceleração escalar com o termo J2 opcional (Kepler puro quando 'include_j2' é False).
+    
+    'include_j2' é invariante ao longo do laço de integração, então o desvio é
+    previsível e o compilador pode retirá-lo do laço (loop unswitching).
+    """
+    if include_j2:
+        return _acceleration_j2(x, y, z)
+
+    r2 = x * x + y * y + z * z
+    k_kepler = -GM_EARTH / (r2 * sqrt(r2))
+    return k_kepler * x, k_kepler * y, k_kepler * z
+
+
+@njit(cache=True)
+def _acceleration_into(r, out):
+    """
+    Versão escalar de 'calculate_acceleration' para um único vetor [x, y, z].
+    
+    Returns:
+        np.array: O próprio buffer 'out', preenchido com [ax, ay, az].
+    """
+    out[0], out[1], out[2] = _acceleration_j2(r[0], r[1], r[2])
+    return out
+
+
+@njit(cache=True)
+def _state_derivatives(state, out):
+    """
+    Versão escalar de 'get_derivatives' para um único estado [rx, ry, rz, vx, vy, vz].
+    
+    Returns:
+        np.array: O próprio buffer 'out', preenchido com [vx, vy, vz, ax, ay, az].
+    """
+    out[0] = state[3]
+    out[1] = state[4]
+    out[2] = state[5]
+    out[3], out[4], out[5] = _acceleration_j2(state[0], state[1], state[2])
+    return out
+
+
+@njit(inline='always')
+def _rk4_step(rx, ry, rz, vx, vy, vz, dt, include_j2=True):
+    """
+    Um passo RK4 para um único satélite, com o estado mantido em escalares (registradores).
+    
+    Como a derivada da posição é a própria velocidade, cada estágio k_i se resume a
+    (v_i, a(r_i)), o que dispensa montar o vetor de derivadas de 6 componentes.
+    """
+    half_dt = 0.5 * dt
+
+    # --- Estágio 1: início do intervalo ---
+    a1x, a1y, a1z = _acceleration(rx, ry, rz, include_j2)
+
+    # --- Estágio 2: ponto médio usando k1 ---
+    v2x = vx + half_dt * a1x
+    v2y = vy + half_dt * a1y
+    v2z = vz + half_dt * a1z
+    a2x, a2y, a2z = _acceleration(rx + half_dt * vx, ry + half_dt * vy, rz + half_dt * vz, include_j2)
+
+    # --- Estágio 3: ponto médio usando k2 ---
+    v3x = vx + half_dt * a2x
+    v3y = vy + half_dt * a2y
+    v3z = vz + half_dt * a2z
+    a3x, a3y, a3z = _acceleration(rx + half_dt * v2x, ry + half_dt * v2y, rz + half_dt * v2z, include_j2)
+
+    # --- Estágio 4: final do intervalo usando k3 ---
+    v4x = vx + dt * a3x
+    v4y = vy + dt * a3y
+    v4z = vz + dt * a3z
+    a4x, a4y, a4z = _acceleration(rx + dt * v3x, ry + dt * v3y, rz + dt * v3z, include_j2)
+
+    # --- Atualização Final (Média Ponderada) ---
+    w = dt / 6.0
+    rx = rx + w * (vx + 2.0 * v2x + 2.0 * v3x + v4x)
+    ry = ry + w * (vy + 2.0 * v2y + 2.0 * v3y + v4y)
+    rz = rz + w * (vz + 2.0 * v2z + 2.0 * v3z + v4z)
+    vx = vx + w * (a1x + 2.0 * a2x + 2.0 * a3x + a4x)
+    vy = vy + w * (a1y + 2.0 * a2y + 2.0 * a3y + a4y)
+    vz = vz + w * (a1z + 2.0 * a2z + 2.0 * a3z + a4z)
+    return rx, ry, rz, vx, vy, vz
+
+
+@njit(inline='always')
+def _is_finite_state(state):
+    """Indica se as 6 componentes de um estado [r, v] são números finitos."""
+    for j in range(6):
+        if not isfinite(state[j]):
+            return False
+    return True
+
+
+@njit(inline='always')
+def _rk4_propagate_row(states, i, dt, n_steps):
+    """
+    Integra a linha 'i' de 'states' por 'n_steps' passos RK4.
+    
+    O estado do objeto é lido uma vez, integrado em registradores durante
+    todos os passos e escrito de volta uma única vez.
+    """
+    rx = states[i, 0]
+    ry = states[i, 1]
+    rz = states[i, 2]
+    vx = states[i, 3]
+    vy = states[i, 4]
+    vz = states[i, 5]
+
+    for _ in range(n_steps):
+        rx, ry, rz, vx, vy, vz = _rk4_step(rx, ry, rz, vx, vy, vz, dt)
+
+    states[i, 0] = rx
+    states[i, 1] = ry
+    states[i, 2] = rz
+    states[i, 3] = vx
+    states[i, 4] = vy
+    states[i, 5] = vz
+
+
+@njit(fastmath=HISTORY_FASTMATH, error_model='numpy', cache=True)
+def _rk4_j2(state0, dt, n, out, include_j2):
+    """
+    Kernel de 'runge_kutta_4': integra um satélite por 'n' passos RK4 guardando o histórico.
+    
+    Args:
+        state0 (np.array): Estado inicial [rx, ry, rz, vx, vy, vz] (float64).
+        dt (float): Passo de tempo da integração (segundos).
+        n (int): Quantidade de passos.
+        out (np.array): Matriz SoA (6, n + 1) pré-alocada; a coluna i recebe o estado no
+            passo i e cada linha é a série de uma componente. Pode ser float32: o
+            estado segue em FP64 nos escalares e só é arredondado na escrita.
+        include_j2 (bool): Inclui a perturbação J2 (invariante durante toda a integração).
+        
+    Returns:
+        np.array: A própria matriz 'out', já preenchida (toda NaN se 'state0' não
+            for finito).
+    """
+    # Estado inicial inválido (ex.: falha do SGP4): o histórico inteiro fica NaN
+    if not _is_finite_state(state0):
+        out[:, :] = np.nan
+        return out
+
+    rx = state0[0]
+    ry = state0[1]
+    rz = state0[2]
+    vx = state0[3]
+    vy = state0[4]
+    vz = state0[5]
+    out[0, 0] = rx
+    out[1, 0] = ry
+    out[2, 0] = rz
+    out[3, 0] = vx
+    out[4, 0] = vy
+    out[5, 0] = vz
+
+    for i in range(n):
+        rx, ry, rz, vx, vy, vz = _rk4_step(rx, ry, rz, vx, vy, vz, dt, include_j2)
+        out[0, i + 1] = rx
+        out[1, i + 1] = ry
+        out[2, i + 1] = rz
+        out[3, i + 1] = vx
+        out[4, i + 1] = vy
+        out[5, i + 1] = vz
+
+    return out
+
+
+@njit(parallel=True, fastmath=HISTORY_FASTMATH, error_model='numpy', cache=True, nogil=True)
+def _rk4_batch(states0, dt, n, out, include_j2):
+    """
+    Kernel de 'runge_kutta_4_batch': aplica '_rk4_j2' a cada satélite em paralelo (prange).
+    
+    Libera o GIL durante a execução (nogil), para que outra thread Python (ex.: a
+    referência SGP4) possa trabalhar ao mesmo tempo. Exceções levantadas dentro do
+    prange se perdem, então um satélite com estado inválido não interrompe o lote:
+    '_rk4_j2' devolve o histórico dele todo em NaN.
+    
+    Args:
+        states0 (np.array): Matriz (N, 6) com os estados iniciais (float64).
+        dt (float): Passo de tempo da integração (segundos).
+        n (int): Quantidade de passos.
+        out (np.array): Array SoA (6, N, n + 1) pré-alocado para os históricos.
+        include_j2 (bool): Inclui a perturbação J2 (invariante durante toda a integração).
+        
+    Returns:
+        np.array: O próprio array 'out', já preenchido.
+    """
+    for s in prange(states0.shape[0]):
+        _rk4_j2(states0[s], dt, n, out[:, s], include_j2)
+
+    return out
+
+
+# Versão pré-compilada (AOT) de '_rk4_j2', gerada por 'python -m src._build_kernels'.
+# Quando o módulo nativo existe, 'runge_kutta_4' o usa e não paga a compilação JIT na
+# primeira chamada; sem ele, recorre ao kernel JIT acima. Recompile o módulo nativo
+# sempre que '_rk4_j2' mudar.
+try:
+    from .orbital_native import rk4_j2 as _rk4_j2_entry
+except ImportError:
+    _rk4_j2_entry = _rk4_j2
+
+
+@njit(inline='always')
+def _rk4_propagate_block(states, block, dt, n_steps):
+    """
+    Integra o bloco 'block' de BATCH_BLOCK_SIZE linhas consecutivas de 'states'.
+    
+    Todos os estágios e passos de cada satélite ficam em registradores; cada linha
+    do bloco é lida e escrita uma única vez (kernel fundido, sem arrays intermediários).
+    """
+    start = block * BATCH_BLOCK_SIZE
+    end = min(start + BATCH_BLOCK_SIZE, states.shape[0])
+    for i in range(start, end):
+        _rk4_propagate_row(states, i, dt, n_steps)
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def rk4_step_batch(states, dt, n_steps):
+    """
+    Avança uma frota inteira 'n_steps' passos RK4, modificando 'states' in-place.
+    
+    Cada satélite é independente, então o laço externo é paralelizado (prange)
+    sobre blocos de BATCH_BLOCK_SIZE satélites.
+    
+    Args:
+        states (np.array): Matriz (N, 6) com [rx, ry, rz, vx, vy, vz] de cada satélite.
+            Pode ser float64 ou float32: a aritmética interna é sempre em precisão
+            dupla e o arredondamento ocorre apenas na escrita de volta ao array.
+        dt (float): Passo de tempo da integração (segundos).
+        n_steps (int): Quantidade de passos a avançar.
+        
+    Returns:
+        np.array: A própria matriz 'states', já atualizada.
+    """
+    n_blocks = (states.shape[0] + BATCH_BLOCK_SIZE - 1) // BATCH_BLOCK_SIZE
+    for block in prange(n_blocks):
+        _rk4_propagate_block(states, block, dt, n_steps)
+
+    return states
+
+
+# ==============================================================================
+# 5. INTEGRADOR ADAPTATIVO (DORMAND-PRINCE 5(4))
+# ==============================================================================
+# Em vez de um passo fixo, o par embutido de 5ª/4ª ordem estima o erro local de
+# cada passo e ajusta o dt de cada satélite: em trechos suaves da órbita o passo
+# cresce e o número de avaliações da aceleração por segundo simulado cai.
+# O último estágio (k7) é avaliado no novo estado e reaproveitado como k1 do
+# passo seguinte (FSAL), de modo que cada passo aceito custa 6 avaliações.
+
+# Tabela de Butcher (coeficientes a_ij dos estágios)
+DP_A21 = 1.0 / 5.0
+DP_A31, DP_A32 = 3.0 / 40.0, 9.0 / 40.0
+DP_A41, DP_A42, DP_A43 = 44.0 / 45.0, -56.0 / 15.0, 32.0 / 9.0
+DP_A51, DP_A52, DP_A53, DP_A54 = 19372.0 / 6561.0, -25360.0 / 2187.0, 64448.0 / 6561.0, -212.0 / 729.0
+DP_A61, DP_A62, DP_A63, DP_A64, DP_A65 = (9017.0 / 3168.0, -355.0 / 33.0, 46732.0 / 5247.0,
+                                          49.0 / 176.0, -5103.0 / 18656.0)
+
+# Pesos da solução de 5ª ordem (iguais à última linha da tabela: propriedade FSAL)
+DP_B1, DP_B3, DP_B4, DP_B5, DP_B6 = 35.0 / 384.0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0
+
+# Diferença entre as soluções de 5ª e 4ª ordem (estimativa do erro local)
+DP_E1, DP_E3, DP_E4, DP_E5, DP_E6, DP_E7 = (71.0 / 57600.0, -71.0 / 16695.0, 71.0 / 1920.0,
+                                            -17253.0 / 339200.0, 22.0 / 525.0, -1.0 / 40.0)
+
+# Controlador de passo PI (valores clássicos de Hairer para o DOPRI5)
+DP_SAFETY = 0.9                     # Margem de segurança sobre o passo "ótimo"
+DP_FAC_MIN, DP_FAC_MAX = 0.2, 10.0  # Limites de redução/ampliação do passo por tentativa
+DP_BETA = 0.04                      # Peso do termo integral (erro do passo anterior)
+DP_EXPO = 0.2 - 0.75 * DP_BETA      # Expoente do termo proporcional
+
+# Saída densa (interpolação de 5ª ordem dentro de um passo, Hairer & Wanner)
+DP_D1, DP_D3, DP_D4 = -12715105075.0 / 11282082432.0, 87487479700.0 / 32700410799.0, -10690763975.0 / 1880347072.0
+DP_D5, DP_D6, DP_D7 = 701980252875.0 / 199316789632.0, -1453857185.0 / 822651844.0, 69997945.0 / 29380423.0
 
-    # Define condição inicial
-    state_history[0, :] = state_initial
-    state_current = state_initial.copy()
 
-    # Loop principal da simulação
-    for i in range(num_steps):
-        t_current = time_series[i]
+@njit(inline='always')
+def _derivatives_into(y, k, stage):
+    """Versão escalar de 'get_derivatives': escreve f(y) na linha 'stage' de 'k'."""
+    k[stage, 0] = y[3]
+    k[stage, 1] = y[4]
+    k[stage, 2] = y[5]
+    k[stage, 3], k[stage, 4], k[stage, 5] = _acceleration_j2(y[0], y[1], y[2])
 
-        # --- Passo 1: Inclinação no início do intervalo ---
-        k1 = delta_t * get_derivatives(t_current, state_current)
 
-        # --- Passo 2: Inclinação no ponto médio (usando k1) ---
-        # Avança meio passo (0.5 * delta_t) usando a inclinação k1
-        k2 = delta_t * get_derivatives(t_current + 0.5 * delta_t, state_current + 0.5 * k1)
+@njit(inline='always')
+def _dopri5_step(y, k, dt, y_stage, y_new, atol, rtol):
+    """
+    Tenta um passo Dormand-Prince de tamanho 'dt' a partir de 'y'.
+    
+    Espera f(y) já calculado em k[0]. Preenche k[1..6] (k[6] = f(y_new), o k1 do
+    próximo passo) e escreve a solução de 5ª ordem em 'y_new'.
+    
+    Returns:
+        float: Norma RMS do erro local, escalada pela tolerância (aceita se <= 1).
+    """
+    for j in range(6):
+        y_stage[j] = y[j] + dt * DP_A21 * k[0, j]
+    _derivatives_into(y_stage, k, 1)
+
+    for j in range(6):
+        y_stage[j] = y[j] + dt * (DP_A31 * k[0, j] + DP_A32 * k[1, j])
+    _derivatives_into(y_stage, k, 2)
+
+    for j in range(6):
+        y_stage[j] = y[j] + dt * (DP_A41 * k[0, j] + DP_A42 * k[1, j] + DP_A43 * k[2, j])
+    _derivatives_into(y_stage, k, 3)
+
+    for j in range(6):
+        y_stage[j] = y[j] + dt * (DP_A51 * k[0, j] + DP_A52 * k[1, j] + DP_A53 * k[2, j]
+                                  + DP_A54 * k[3, j])
+    _derivatives_into(y_stage, k, 4)
+
+    for j in range(6):
+        y_stage[j] = y[j] + dt * (DP_A61 * k[0, j] + DP_A62 * k[1, j] + DP_A63 * k[2, j]
+                                  + DP_A64 * k[3, j] + DP_A65 * k[4, j])
+    _derivatives_into(y_stage, k, 5)
+
+    for j in range(6):
+        y_new[j] = y[j] + dt * (DP_B1 * k[0, j] + DP_B3 * k[2, j] + DP_B4 * k[3, j]
+                                + DP_B5 * k[4, j] + DP_B6 * k[5, j])
+    _derivatives_into(y_new, k, 6)
+
+    # Erro local por componente, escalado por uma tolerância mista (absoluta + relativa)
+    err2 = 0.0
+    for j in range(6):
+        e = dt * (DP_E1 * k[0, j] + DP_E3 * k[2, j] + DP_E4 * k[3, j] + DP_E5 * k[4, j]
+                  + DP_E6 * k[5, j] + DP_E7 * k[6, j])
+        scale = atol + rtol * max(abs(y[j]), abs(y_new[j]))
+        err2 += (e / scale) * (e / scale)
+    return sqrt(err2 / 6.0)
+
+
+@njit(inline='always')
+def _dopri5_controller(h, err, err_old):
+    """
+    Controlador de passo PI do DOPRI5.
+    
+    Returns:
+        tuple: (aceito, h_novo, err_old) -> se o passo 'h' é aceito, o próximo passo
+        sugerido e o erro a ser lembrado para o próximo controle.
+    """
+    fac_err = err ** DP_EXPO
+    if err <= 1.0:
+        # Passo aceito: controlador PI (usa também o erro do passo anterior)
+        fac = fac_err / err_old ** DP_BETA / DP_SAFETY
+        fac = max(1.0 / DP_FAC_MAX, min(1.0 / DP_FAC_MIN, fac))
+        return True, h / fac, max(err, 1e-4)
+
+    # Passo rejeitado: reduz e tenta de novo a partir do mesmo estado
+    return False, h / min(1.0 / DP_FAC_MIN, fac_err / DP_SAFETY), err_old
+
+
+@njit(inline='always')
+def _dopri5_dense_coeffs(y, y_new, k, h, rcont):
+    """
+    Prepara em 'rcont' (5, 6) os coeficientes da saída densa do passo y -> y_new.
+    
+    Precisa de k[0..6] do passo recém-aceito (antes de k[6] ser copiado para k[0]).
+    """
+    for j in range(6):
+        y_diff = y_new[j] - y[j]
+        b_spl = h * k[0, j] - y_diff
+        rcont[0, j] = y[j]
+        rcont[1, j] = y_diff
+        rcont[2, j] = b_spl
+        rcont[3, j] = y_diff - h * k[6, j] - b_spl
+        rcont[4, j] = h * (DP_D1 * k[0, j] + DP_D3 * k[2, j] + DP_D4 * k[3, j] + DP_D5 * k[4, j]
+                           + DP_D6 * k[5, j] + DP_D7 * k[6, j])
+
+
+@njit(inline='always')
+def _dopri5_dense_eval(rcont, theta, out, row):
+    """Escreve na coluna 'row' de 'out' (SoA) o estado interpolado na fração 'theta' (0..1) do passo."""
+    theta1 = 1.0 - theta
+    for j in range(6):
+        out[j, row] = rcont[0, j] + theta * (rcont[1, j] + theta1 * (
+            rcont[2, j] + theta * (rcont[3, j] + theta1 * rcont[4, j])))
+
+
+@njit(inline='always')
+def _dopri5_propagate_row(states, dt_sat, i, t_span, tol, y, y_stage, y_new, k):
+    """
+    Integra a linha 'i' de 'states' por exatamente 't_span' segundos com passo adaptativo.
+    
+    O passo inicial é 'dt_sat[i]' e o passo sugerido ao final é guardado de volta nele,
+    para que a próxima chamada continue de onde o controlador parou.
+    """
+    for j in range(6):
+        y[j] = states[i, j]
+    _derivatives_into(y, k, 0)
+
+    dt = dt_sat[i]
+    t = 0.0
+    err_old = 1e-4
+    while t < t_span:
+        # O último passo é encurtado para terminar exatamente em t_span
+        clipped = t + dt >= t_span
+        h = t_span - t if clipped else dt
 
-        # --- Passo 3: Melhor estimativa no ponto médio (usando k2) ---
-        k3 = delta_t * get_derivatives(t_current + 0.5 * delta_t, state_current + 0.5 * k2)
+        err = _dopri5_step(y, k, h, y_stage, y_new, tol, tol)
+        if not isfinite(err):
+            # Estado inválido (NaN/inf): sem estimativa de erro o controlador reduziria
+            # o passo para sempre; a linha fica em NaN
+            for j in range(6):
+                y[j] = np.nan
+            break
+        accepted, h_next, err_old = _dopri5_controller(h, err, err_old)
+        if accepted:
+            t = t_span if clipped else t + h
+            for j in range(6):
+                y[j] = y_new[j]
+                k[0, j] = k[6, j]   # FSAL
+            if not clipped:
+                dt = h_next
+        else:
+            dt = h_next
 
-        # --- Passo 4: Inclinação no final do intervalo (usando k3) ---
-        k4 = delta_t * get_derivatives(t_current + delta_t, state_current + k3)
+    for j in range(6):
+        states[i, j] = y[j]
+    dt_sat[i] = dt
 
-        # --- Atualização Final (Média Ponderada) ---
-        # k2 e k3 têm peso 2 porque representam o ponto médio (mais preciso)
-        state_next = state_current + (1.0/6.0) * (k1 + 2.0*k2 + 2.0*k3 + k4)
 
-        # Atualiza variáveis para a próxima iteração
-        state_current = state_next
-        state_history[i + 1, :] = state_next
-        time_series[i + 1] = t_current + delta_t
+@njit(parallel=True, fastmath=HISTORY_FASTMATH, error_model='numpy', cache=True)
+def dopri5_propagate_batch(states, dt_sat, t_span, tol):
+    """
+    Avança uma frota inteira 't_span' segundos com Dormand-Prince 5(4), in-place.
+    
+    Cada satélite escolhe seus próprios passos, mas todos terminam no mesmo instante,
+    o que mantém a frota sincronizada com a grade de tempo da referência SGP4.
+    
+    Args:
+        states (np.array): Matriz (N, 6) com [rx, ry, rz, vx, vy, vz] de cada satélite
+            (float64 ou float32; a aritmética interna é sempre em precisão dupla).
+        dt_sat (np.array): Vetor (N,) float64 com o passo atual de cada satélite
+            (segundos). É lido como passo inicial e atualizado com o passo sugerido.
+        t_span (float): Intervalo de tempo a avançar (segundos).
+        tol (float): Tolerância do erro local por componente (absoluta e relativa).
+        
+    Returns:
+        np.array: A própria matriz 'states', já atualizada.
+    """
+    n_blocks = (states.shape[0] + BATCH_BLOCK_SIZE - 1) // BATCH_BLOCK_SIZE
+    for block in prange(n_blocks):
+        # Área de trabalho do bloco (alocada uma vez e reutilizada por todas as linhas)
+        y = np.empty(6)
+        y_stage = np.empty(6)
+        y_new = np.empty(6)
+        k = np.empty((7, 6))
+
+        start = block * BATCH_BLOCK_SIZE
+        end = min(start + BATCH_BLOCK_SIZE, states.shape[0])
+        for i in range(start, end):
+            _dopri5_propagate_row(states, dt_sat, i, t_span, tol, y, y_stage, y_new, k)
+
+    return states
+
+
+@njit(fastmath=HISTORY_FASTMATH, error_model='numpy', cache=True)
+def _dopri5_j2(state0, dt_out, n, atol, rtol, out):
+    """
+    Kernel de 'dopri5_j2': integra um satélite com passo adaptativo até n * dt_out segundos.
+    
+    Os passos internos são escolhidos pelo controlador; o histórico é gravado na grade
+    fixa 0, dt_out, ..., n * dt_out pela saída densa de cada passo aceito, sem
+    forçar o integrador a parar em cada ponto da grade.
+    
+    Args:
+        state0 (np.array): Estado inicial [rx, ry, rz, vx, vy, vz] (float64).
+        dt_out (float): Espaçamento da grade de saída (segundos); também é o passo inicial.
+        n (int): Quantidade de intervalos da grade de saída.
+        atol (float): Tolerância absoluta do erro local por componente.
+        rtol (float): Tolerância relativa do erro local por componente.
+        out (np.array): Matriz SoA (6, n + 1) pré-alocada (float64 ou float32).
+        
+    Returns:
+        np.array: A própria matriz 'out', já preenchida. Um estado inicial não finito
+            dá um histórico todo em NaN; se o erro local deixar de ser finito no meio
+            da integração, os instantes restantes ficam em NaN.
+    """
+    # Estado inicial inválido (ex.: falha do SGP4): o histórico inteiro fica NaN
+    if not _is_finite_state(state0):
+        out[:, :] = np.nan
+        return out
+
+    y = np.empty(6)
+    y_stage = np.empty(6)
+    y_new = np.empty(6)
+    k = np.empty((7, 6))
+    rcont = np.empty((5, 6))
+
+    for j in range(6):
+        y[j] = state0[j]
+        out[j, 0] = state0[j]
+    _derivatives_into(y, k, 0)
+
+    t_end = n * dt_out
+    t = 0.0
+    h = dt_out
+    err_old = 1e-4
+    row = 1
+    while row <= n:
+        # O último passo é encurtado para terminar exatamente em t_end
+        h = min(h, t_end - t)
+
+        err = _dopri5_step(y, k, h, y_stage, y_new, atol, rtol)
+        if not isfinite(err):
+            # Sem estimativa de erro o controlador reduziria o passo para sempre
+            out[:, row:] = np.nan
+            break
+        accepted, h_next, err_old = _dopri5_controller(h, err, err_old)
+        if accepted:
+            t_new = t_end if t + h >= t_end else t + h
+
+            # Pontos da grade de saída cobertos por este passo
+            if row * dt_out <= t_new:
+                _dopri5_dense_coeffs(y, y_new, k, h, rcont)
+                while row <= n and row * dt_out <= t_new:
+                    _dopri5_dense_eval(rcont, (row * dt_out - t) / h, out, row)
+                    row += 1
+
+            t = t_new
+            for j in range(6):
+                y[j] = y_new[j]
+                k[0, j] = k[6, j]   # FSAL
+        h = h_next
+
+    return out
+
+
+@njit(parallel=True, fastmath=HISTORY_FASTMATH, error_model='numpy', cache=True, nogil=True)
+def _dopri5_j2_batch(states0, dt_out, n, atol, rtol, out):
+    """Kernel de 'dopri5_j2_batch': aplica '_dopri5_j2' a cada satélite em paralelo (prange), sem o GIL."""
+    for s in prange(states0.shape[0]):
+        _dopri5_j2(states0[s], dt_out, n, atol, rtol, out[:, s])
+
+    return out
+
+
+def dopri5_j2(state_initial, delta_t, num_steps, atol=1e-9, rtol=1e-9):
+    """
+    Propagador Orbital com Dormand-Prince 5(4) adaptativo, no mesmo formato de 'runge_kutta_4'.
+    
+    O integrador escolhe internamente o tamanho dos passos; 'delta_t' define apenas a
+    grade em que o histórico é gravado (preenchida por interpolação de 5ª ordem).
+    
+    Args:
+        state_initial (np.array): Estado inicial [r, v].
+        delta_t (float): Espaçamento da grade de saída (segundos).
+        num_steps (int): Quantidade de intervalos da grade de saída.
+        atol (float, opcional): Tolerância absoluta do erro local (km e km/s).
+        rtol (float, opcional): Tolerância relativa do erro local.
         
-    return time_series, state_history
\ No newline at end of file
+    Returns:
+        tuple: (time_series, state_history) -> view (num_steps + 1, 6) do buffer SoA.
+    """
+    components = np.empty((6, num_steps + 1))
+    time_series = np.arange(num_steps + 1) * float(delta_t)
+
+    _dopri5_j2(np.asarray(state_initial, dtype=np.float64), float(delta_t), num_steps,
+               float(atol), float(rtol), components)
+
+    return time_series, components.T
+
+
+def dopri5_j2_batch(states_initial, delta_t, num_steps, atol=1e-9, rtol=1e-9, dtype=np.float64):
+    """
+    Versão em lote de 'dopri5_j2', no mesmo formato de 'runge_kutta_4_batch'.
+    
+    Args:
+        states_initial (np.array): Matriz (N, 6) com o estado inicial [r, v] de cada satélite.
+        delta_t (float): Espaçamento da grade de saída (segundos).
+        num_steps (int): Quantidade de intervalos da grade de saída.
+        atol (float, opcional): Tolerância absoluta do erro local (km e km/s).
+        rtol (float, opcional): Tolerância relativa do erro local.
+        dtype (np.dtype, opcional): Tipo do histórico gravado (a integração é sempre em FP64).
+        
+    Returns:
+        tuple: (time_series, state_history) -> 'state_history' tem formato (N, num_steps + 1, 6)
+            (view transposta do buffer SoA).
+    """
+    states_initial = np.asarray(states_initial, dtype=np.float64)
+
+    components = np.empty((6, states_initial.shape[0], num_steps + 1), dtype=dtype)
+    time_series = np.arange(num_steps + 1) * float(delta_t)
+
+    _dopri5_j2_batch(states_initial, float(delta_t), num_steps, float(atol), float(rtol), components)
+
+    return time_series, components.transpose(1, 2, 0)
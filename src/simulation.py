@@ -4,14 +4,17 @@ Descrição: Orquestrador principal das simulações de tráfego espacial.
 
 Este módulo é responsável por:
 1. Gerenciar a execução em lote (batch) de múltiplos satélites.
-2. Executar o 'Motor Físico' (RK4) para cada objeto.
+2. Executar o 'Motor Físico' (RK4) para todos os objetos (em paralelo).
 3. Executar o 'Modelo de Referência' (SGP4/Skyfield) para fins de validação.
 4. Calcular métricas de erro e consolidar os resultados em estruturas de dados (Pandas)
    para análise e visualização posterior.
 """
 
-from src.data_handler import get_initial_state_and_time
-from src.orbital_mechanics import runge_kutta_4
+from concurrent.futures import ThreadPoolExecutor
+from math import sqrt
+
+from src.data_handler import get_sgp4_states_batch
+from src.orbital_mechanics import runge_kutta_4_batch, dopri5_j2_batch
 import numpy as np
 import pandas as pd
 from skyfield.api import wgs84
@@ -27,101 +30,212 @@ DURATION_HOURS = 1
 # Número total de passos (iterações) que o loop do RK4 executará.
 NUM_STEPS = int(DURATION_HOURS * 3600 / DELTA_T_SECONDS)
 
+# Tipo numérico do histórico armazenado (a integração em si é sempre em FP64).
+# FP32 guarda posições em km com resolução melhor que 1 m em LEO e reduz pela
+# metade a memória da tabela final.
+HISTORY_DTYPE = np.float32
+
+# Tolerância (absoluta e relativa) do erro local quando o integrador é o DOPRI5.
+# Nesse caso DELTA_T_SECONDS define apenas a grade de saída do histórico.
+DOPRI5_TOLERANCE = 1e-9
+
+# Referencial de toda a simulação: o TEME, nativo do SGP4. O erro só compara posições
+# no mesmo referencial, então a rotação TEME -> GCRS (precessão/nutação por instante)
+# é dispensada. O eixo z do TEME é o polo verdadeiro da data, justamente o eixo de
+# simetria assumido pelo termo J2.
+SIMULATION_FRAME = 'teme'
+
+
+def _propagate_fleet(states_initial, integrator):
+    """
+    Propaga a frota inteira com o integrador escolhido e devolve o histórico em lote.
+    
+    Args:
+        states_initial (np.array): Matriz (N, 6) com o estado inicial de cada satélite.
+        integrator (str): 'rk4' ou 'dopri5'.
+        
+    Returns:
+        np.array: Histórico (N_satélites, NUM_STEPS + 1, 6) no tipo HISTORY_DTYPE.
+    """
+    if integrator == 'rk4':
+        _, state_history_all = runge_kutta_4_batch(states_initial, DELTA_T_SECONDS, NUM_STEPS,
+                                                   dtype=HISTORY_DTYPE)
+    elif integrator == 'dopri5':
+        _, state_history_all = dopri5_j2_batch(states_initial, DELTA_T_SECONDS, NUM_STEPS,
+                                               atol=DOPRI5_TOLERANCE, rtol=DOPRI5_TOLERANCE,
+                                               dtype=HISTORY_DTYPE)
+    else:
+        raise ValueError(f"Integrador desconhecido: '{integrator}' (use 'rk4' ou 'dopri5')")
+
+    return state_history_all
 
-def run_multi_object_simulation_and_validate(ts, list_of_satellites):
+
+def run_multi_object_simulation_and_validate(ts, list_of_satellites, integrator='rk4',
+                                             validate_full_trajectory=False):
     """
     Executa a simulação e validação para uma lista de objetos espaciais.
     
     Lógica do Algoritmo:
-    Para cada satélite na lista:
-      1. Obtém o estado inicial (posição/velocidade) do TLE.
-      2. Propaga a órbita usando nosso modelo numérico (RK4 + J2).
-      3. Propaga a órbita usando o modelo analítico padrão (SGP4 via Skyfield).
+    Todos os satélites partem de uma época comum (a do TLE mais recente), o que
+    permite propagar a referência SGP4 da frota inteira em uma única chamada em lote.
+      1. Obtém o estado inicial (posição/velocidade) de cada TLE na época comum
+         (primeiro instante da mesma referência SGP4 em lote). Satélites cujo TLE o
+         SGP4 não consegue propagar até essa época são descartados, com aviso.
+      2. Propaga a órbita de todos os satélites de uma vez (RK4 + J2, em paralelo).
+         Com a trajetória de referência completa, o SGP4 dos demais instantes é
+         calculado ao mesmo tempo numa thread separada.
+    Em seguida, para cada satélite na lista:
+      3. Lê a posição de referência (SGP4) final já calculada em lote.
       4. Compara os resultados finais para calcular o erro de precisão.
-      5. Armazena a trajetória completa e metadados.
+    Por padrão a referência SGP4 só é calculada nos instantes inicial e final (os únicos
+    usados pelo erro final); a trajetória de referência completa é opcional.
+    Por fim, as trajetórias e metadados da frota são montados em uma única tabela.
     
     Args:
         ts (Timescale): Objeto de tempo do Skyfield.
         list_of_satellites (list): Lista de objetos EarthSatellite (já filtrados).
+        integrator (str, opcional): 'rk4' (passo fixo DELTA_T_SECONDS) ou 'dopri5'
+            (Dormand-Prince 5(4) adaptativo, com o histórico interpolado na mesma grade).
+        validate_full_trajectory (bool, opcional): Se True, calcula a referência SGP4 em
+            todos os passos e adiciona a coluna 'step_error_km' (erro em cada passo).
         
     Returns:
         pd.DataFrame: DataFrame único contendo as trajetórias e erros de todos os satélites.
     """
 
-    all_results = []
-
     # Cria o array de tempo simulado [0, 60, 120, ..., 3600]
     time_series = np.arange(0, DURATION_HOURS * 3600 + DELTA_T_SECONDS, DELTA_T_SECONDS)
 
+    # A mesma grade em dias (escala de tempo do Skyfield), convertida uma única vez
+    time_series_days = time_series / (24 * 3600)
+
+    # ---------------------------------------------------------
+    # 0. ÉPOCA COMUM DA FROTA
+    # ---------------------------------------------------------
+    # O SatrecArray avalia todos os satélites nos mesmos instantes, então a frota é
+    # sincronizada na época do TLE mais recente (nenhum satélite é propagado para trás).
+    t_common = max((satellite.epoch for satellite in list_of_satellites), key=lambda t: t.tt)
+
+    # ---------------------------------------------------------
+    # 1. DEFINIÇÃO DAS CONDIÇÕES INICIAIS
+    # ---------------------------------------------------------
+    # O estado inicial [r, v] de cada TLE na época comum vem da referência em lote
+    # no primeiro instante: nenhuma consulta ao Skyfield por satélite.
+    # Uma única chamada ao núcleo em C do SGP4 para todos os satélites, já no
+    # referencial da simulação (SIMULATION_FRAME), sem rotação de referencial.
+    t_initial = ts.tt_jd(t_common.tt + time_series_days[:1])
+    r_initial, v_initial = get_sgp4_states_batch(list_of_satellites, t_initial, SIMULATION_FRAME)
+
+    # TLEs que o SGP4 não consegue propagar até a época comum (já avisados pelo nome em
+    # get_sgp4_states_batch) ficam fora da simulação, em vez de entrarem como NaN
+    valid = np.isfinite(r_initial[:, 0, :]).all(axis=1) & np.isfinite(v_initial[:, 0, :]).all(axis=1)
+    if not valid.all():
+        print(f"  -> {np.count_nonzero(~valid)} satélite(s) removido(s) da simulação (falha do SGP4)")
+        list_of_satellites = [satellite for satellite, ok in zip(list_of_satellites, valid) if ok]
+        r_initial = r_initial[valid]
+        v_initial = v_initial[valid]
+
+    num_satellites = len(list_of_satellites)
+
+    # Erro final de cada satélite (preenchido no loop de validação)
+    errors_km = np.empty(num_satellites)
+
+    states_initial = np.empty((num_satellites, 6))
+    states_initial[:, 0:3] = r_initial[:, 0, :]
+    states_initial[:, 3:6] = v_initial[:, 0, :]
+
+    # ---------------------------------------------------------
+    # 2. PROCESSO DE PROPAGAÇÃO (MOTOR FÍSICO)
+    # ---------------------------------------------------------
+    # 2.1. Simulação de Referência (Benchmark SGP4)
+    # Instantes restantes: a grade inteira apenas se o erro passo a passo for pedido;
+    # caso contrário, só o fim (erro final).
+    # Formato: (N_satélites, N_instantes, 3) em km
+    reference_days = time_series_days[1:] if validate_full_trajectory else time_series_days[-1:]
+    t_reference = ts.tt_jd(t_common.tt + reference_days)
+
+    # 2.2. Simulação Numérica (Nosso Modelo)
+    # Uma única chamada ao integrador em lote (orbital_mechanics.py): cada satélite
+    # é independente, então a frota é dividida entre os núcleos da CPU.
+    # Formato: (N_satélites, NUM_STEPS + 1, 6), view do buffer SoA do integrador
+    if validate_full_trajectory:
+        # Grade inteira: o SGP4 prende o GIL durante toda a chamada ao núcleo em C, mas
+        # os kernels do motor numérico o liberam, então a referência avança numa thread
+        # própria enquanto a frota é propagada na thread principal. (O motor fica na
+        # thread principal porque o pool de threads do Numba não deve ser iniciado a
+        # partir de uma thread secundária.)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='sgp4-reference') as executor:
+            reference = executor.submit(get_sgp4_states_batch, list_of_satellites, t_reference,
+                                        SIMULATION_FRAME)
+            state_history_all = _propagate_fleet(states_initial, integrator)
+            r_reference, _ = reference.result()
+    else:
+        # Só o instante final: uma chamada curta ao SGP4, sem thread extra
+        r_reference, _ = get_sgp4_states_batch(list_of_satellites, t_reference, SIMULATION_FRAME)
+        state_history_all = _propagate_fleet(states_initial, integrator)
+
+    # Posições finais da frota extraídas uma única vez, como blocos (N, 3) contíguos:
+    # o loop abaixo apenas lê uma linha de cada, sem fatiar as trajetórias completas.
+    final_r_rk4_all = np.ascontiguousarray(state_history_all[:, -1, 0:3])
+    final_r_skyfield_all = np.ascontiguousarray(r_reference[:, -1, :])
+
     # Loop de Iteração sobre o "Tráfego" (Lista de Satélites)
     for i, satellite in enumerate(list_of_satellites):
-        print(f"  -> Propagando e Validando {satellite.name} ({i + 1}/{len(list_of_satellites)})")
-
-        # ---------------------------------------------------------
-        # 1. DEFINIÇÃO DAS CONDIÇÕES INICIAIS
-        # ---------------------------------------------------------
-        # Converte o TLE (elementos orbitais) em vetores cartesianos [r, v]
-        # t0 é o instante exato (Epoch) onde a simulação começa para este satélite.
-        t0, state_initial = get_initial_state_and_time(satellite, ts)
-
-        # ---------------------------------------------------------
-        # 2. PROCESSO DE PROPAGAÇÃO (MOTOR FÍSICO)
-        # ---------------------------------------------------------
-        
-        # 2.1. Simulação Numérica (Nosso Modelo)
-        # Chama o integrador RK4 implementado em orbital_mechanics.py
-        # Retorna o histórico completo de posições e velocidades.
-        _, state_history_rk4 = runge_kutta_4(
-            state_initial, DELTA_T_SECONDS, NUM_STEPS
-        )
-
-        # 2.2. Simulação de Referência (Benchmark SGP4)
-        # Preparamos arrays para guardar a "verdade" do Skyfield
-        r_skyfield_history = np.zeros((NUM_STEPS + 1, 3))
-        
-        # Gera os tempos exatos para consultar o SGP4
-        t_skyfield_series = ts.tt_jd(t0.tt + time_series / (24 * 3600))
-
-        # Consulta o Skyfield para cada passo de tempo
-        for j, t_skyfield in enumerate(t_skyfield_series):
-            geocentric_position = satellite.at(t_skyfield)
-            r_vector = geocentric_position.position.km
-            r_skyfield_history[j, :] = r_vector
+        print(f"  -> Validando {satellite.name} ({i + 1}/{num_satellites})")
 
         # ---------------------------------------------------------
         # 3. ANÁLISE DE VALIDAÇÃO (CÁLCULO DE ERRO)
         # ---------------------------------------------------------
         
         # Pega a última posição calculada pelo nosso RK4
-        final_r_rk4 = state_history_rk4[-1, 0:3]
+        final_r_rk4 = final_r_rk4_all[i]
         
         # Pega a última posição calculada pelo Skyfield (Referência)
-        final_r_skyfield = r_skyfield_history[-1, :]
+        final_r_skyfield = final_r_skyfield_all[i]
 
         # Calcula a distância Euclidiana (magnitude do vetor diferença)
         # Isso quantifica o quanto nosso modelo desviou do padrão ouro.
-        difference_vector = final_r_rk4 - final_r_skyfield
-        error_magnitude = np.linalg.norm(difference_vector)  # Erro em km
-
-        # ---------------------------------------------------------
-        # 4. ESTRUTURAÇÃO E ARMAZENAMENTO (BIG DATA)
-        # ---------------------------------------------------------
-        
-        # Converte a matriz NumPy do RK4 em um DataFrame Pandas
-        df_orbit = pd.DataFrame(state_history_rk4, columns=['rx', 'ry', 'rz', 'vx', 'vy', 'vz'])
-        
-        # Enriquece os dados com metadados e resultados da validação
-        df_orbit['time_step'] = time_series[:len(df_orbit)] 
-        df_orbit['satellite_name'] = satellite.name
-        df_orbit['satellite_id'] = satellite.model.satnum
-        
-        # Armazena o erro calculado (igual para todas as linhas deste satélite)
+        # Para 3 componentes, a raiz escalar (math.sqrt) evita o despacho genérico
+        # de np.linalg.norm (eixos, promoção de tipos) a cada satélite.
+        dx, dy, dz = final_r_rk4 - final_r_skyfield
+        errors_km[i] = sqrt(dx * dx + dy * dy + dz * dz)  # Erro em km
+
+    # Erro em cada passo (opcional): distância RK4 x SGP4 de toda a frota em toda a grade
+    if validate_full_trajectory:
+        r_skyfield_all = np.concatenate((r_initial, r_reference), axis=1)
+        difference_all = state_history_all[:, :, 0:3] - r_skyfield_all
+        step_errors_km = np.sqrt(np.einsum('...i,...i->...', difference_all, difference_all))
+
+    # ---------------------------------------------------------
+    # 4. ESTRUTURAÇÃO E ARMAZENAMENTO (BIG DATA)
+    # ---------------------------------------------------------
+    # Uma linha por (satélite, passo), na mesma ordem do histórico em lote. O histórico
+    # é guardado por componente (SoA, (6, N, NUM_STEPS + 1)): desfazer a transposição e
+    # achatar dá, sem cópia, uma série contígua por coluna numérica.
+    rows_per_satellite = NUM_STEPS + 1
+    components = state_history_all.transpose(2, 0, 1).reshape(6, num_satellites * rows_per_satellite)
+
+    # Nomes como categoria: cada linha guarda apenas um código inteiro que aponta
+    # para a lista de nomes únicos (sem repetir a string em todas as linhas)
+    name_codes, unique_names = pd.factorize(pd.Series([satellite.name for satellite in list_of_satellites]))
+    satellite_ids = np.array([satellite.model.satnum for satellite in list_of_satellites])
+
+    final_result_df = pd.DataFrame({
+        'rx': components[0],
+        'ry': components[1],
+        'rz': components[2],
+        'vx': components[3],
+        'vy': components[4],
+        'vz': components[5],
+        'time_step': np.tile(time_series, num_satellites),
+        'satellite_name': pd.Categorical.from_codes(np.repeat(name_codes, rows_per_satellite),
+                                                    categories=unique_names),
+        'satellite_id': np.repeat(satellite_ids, rows_per_satellite),
+        # Erro final (igual para todas as linhas de um satélite)
         # Útil para filtrar depois: "Mostre apenas satélites com erro > 1km"
-        df_orbit['error_km'] = error_magnitude 
-
-        all_results.append(df_orbit)
-
-    # Consolidação: Junta todas as trajetórias individuais em uma única tabela mestre
-    final_result_df = pd.concat(all_results, ignore_index=True)
+        'error_km': np.repeat(errors_km, rows_per_satellite),
+    })
+    if validate_full_trajectory:
+        final_result_df['step_error_km'] = step_errors_km.reshape(-1)
     
-    return final_result_df
\ No newline at end of file
+    return final_result_df
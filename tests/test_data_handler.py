@@ -0,0 +1,76 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+from skyfield.api import load, EarthSatellite
+from src.data_handler import get_sgp4_states_batch, satellites_to_dataframe, filter_satellites_by_prefix
+
+# TLE real da ISS e uma cópia "antiga" (época um ano antes, arrasto exagerado) que o
+# SGP4 não consegue propagar até a época da ISS
+ISS_LINE1 = '1 25544U 98067A   14020.93268519  .00009878  00000-0  18200-3 0  5082'
+ISS_LINE2 = '2 25544  51.6498 109.4756 0003572  55.9686 274.8005 15.49815350868473'
+STALE_LINE1 = '1 25544U 98067A   13020.93268519  .00009878  00000-0  18200-1 0  5082'
+
+class TestDataHandler(unittest.TestCase):
+    def setUp(self):
+        self.ts = load.timescale()
+        self.iss = EarthSatellite(ISS_LINE1, ISS_LINE2, 'ISS (ZARYA)', self.ts)
+        self.stale = EarthSatellite(STALE_LINE1, ISS_LINE2, 'STALE', self.ts)
+
+    #TESTE PARA get_sgp4_states_batch (Falhas do SGP4 devem virar NaN e ser avisadas pelo nome)
+    def test_sgp4_batch_flags_failed_satellites(self):
+        t = self.ts.tt_jd(np.array([self.iss.epoch.tt]))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            r, v = get_sgp4_states_batch([self.iss, self.stale], t)
+
+        self.assertTrue(np.isfinite(r[0]).all() and np.isfinite(v[0]).all(),
+                        msg="The valid satellite must have a finite state.")
+        self.assertTrue(np.isnan(r[1]).all(), msg="The failed satellite must come back as NaN.")
+        self.assertIn('STALE', output.getvalue(), msg="The failed satellite must be reported by name.")
+
+    #TESTE PARA get_sgp4_states_batch (Em GCRS o lote deve reproduzir 'satellite.at()')
+    def test_sgp4_batch_gcrs_matches_skyfield(self):
+        t = self.ts.tt_jd(self.iss.epoch.tt + np.array([0.0, 0.01, 0.02]))
+
+        r, v = get_sgp4_states_batch([self.iss], t)
+
+        self.assertEqual(r.shape, (1, 3, 3), msg="The batch must have shape (N_satellites, N_times, 3).")
+        geocentric = self.iss.at(t)
+        np.testing.assert_allclose(r[0], geocentric.position.km.T, atol=1e-6,
+                                   err_msg="The batched GCRS position differs from satellite.at().")
+        np.testing.assert_allclose(v[0], geocentric.velocity.km_per_s.T, atol=1e-9,
+                                   err_msg="The batched GCRS velocity differs from satellite.at().")
+
+    def test_sgp4_batch_invalid_frame_raises(self):
+        t = self.ts.tt_jd(np.array([self.iss.epoch.tt]))
+        with self.assertRaises(ValueError):
+            get_sgp4_states_batch([self.iss], t, 'itrs')
+
+    #TESTE PARA satellites_to_dataframe (Colunas tipadas, uma linha por satélite)
+    def test_satellites_to_dataframe_columns(self):
+        df = satellites_to_dataframe([self.iss, self.stale])
+
+        self.assertEqual(df.columns.tolist(), ['name', 'catalog_number', 'epoch', 'object'])
+        self.assertEqual(df['name'].tolist(), ['ISS (ZARYA)', 'STALE'])
+        self.assertEqual(df['catalog_number'].dtype, np.int64,
+                         msg="The NORAD catalog number must be an integer column.")
+        self.assertEqual(df['catalog_number'].iloc[0], 25544)
+        self.assertIs(df['object'].iloc[0], self.iss,
+                      msg="Each row must keep its own EarthSatellite object.")
+        self.assertLess(abs(df['epoch'].iloc[0] - self.iss.epoch.utc_datetime()).total_seconds(), 1e-3,
+                        msg="The epoch column must match the TLE epoch.")
+
+    #TESTE PARA filter_satellites_by_prefix (Cada linha filtrada mantém o próprio objeto)
+    def test_filter_by_prefix_keeps_rows_consistent(self):
+        for satellites in ([self.iss, self.stale], [self.stale, self.iss]):
+            filtered = filter_satellites_by_prefix(satellites_to_dataframe(satellites), 'iss')
+
+            self.assertEqual(filtered['name'].tolist(), ['ISS (ZARYA)'],
+                             msg="The prefix filter must keep only the matching names.")
+            self.assertIs(filtered['object'].iloc[0], self.iss,
+                          msg="The filtered row must keep its own EarthSatellite object.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import numpy as np
-from src.orbital_mechanics import calculate_acceleration, get_derivatives, runge_kutta_4
+from src.orbital_mechanics import (calculate_acceleration, get_derivatives, runge_kutta_4, runge_kutta_4_batch,
+                                   rk4_step_batch, dopri5_propagate_batch, dopri5_j2, dopri5_j2_batch)
 from src.constants import GM_EARTH, RADIUS_EARTH
 
 class TestOrbitalMechanics(unittest.TestCase):
@@ -32,6 +33,17 @@ class TestOrbitalMechanics(unittest.TestCase):
         self.assertAlmostEqual(a_calculated_vector[2], 0.0, places=10,
                                msg="The Z component from acceleration should be zero")
 
+    def test_acceleration_batch_matches_single(self):
+        r_batch = np.array([self.r_test, [0.0, 6800.0, 1200.0], [-4000.0, 3000.0, -5000.0]])
+
+        a_batch = calculate_acceleration(r_batch)
+
+        self.assertEqual(a_batch.shape, (3, 3),
+                         msg="The batched acceleration must keep the (N, 3) shape")
+        for r_single, a_row in zip(r_batch, a_batch):
+            np.testing.assert_array_almost_equal(calculate_acceleration(r_single), a_row, decimal=12,
+                                                 err_msg="Batched and single acceleration differ")
+
     #TESTES PARA get_derivatives
     def test_derivatives_output_size(self):
         derivs = get_derivatives(0, self.state_test)
@@ -43,6 +55,29 @@ class TestOrbitalMechanics(unittest.TestCase):
         np.testing.assert_array_almost_equal(self.v_test, derivs[0:3], decimal=5,
                                              err_msg="The first three components should be the velocities.")
 
+    def test_derivatives_out_buffer(self):
+        out = np.empty(6)
+        derivs = get_derivatives(0, self.state_test, out)
+
+        self.assertIs(derivs, out, msg="The derivatives must be written into the given buffer.")
+        np.testing.assert_array_almost_equal(get_derivatives(0, self.state_test), out, decimal=12,
+                                             err_msg="The buffered derivatives differ from the allocated ones.")
+
+        integer_batch = np.array([[7000, 0, 0, 0, 7, 0]])
+        derivs_integer = get_derivatives(0, integer_batch)
+        self.assertEqual(derivs_integer.dtype, np.float64,
+                         msg="Integer states must produce float64 derivatives.")
+        np.testing.assert_array_almost_equal(derivs_integer, get_derivatives(0, integer_batch.astype(float)),
+                                             decimal=12, err_msg="Integer and float states give different derivatives.")
+
+    def test_derivatives_integer_state(self):
+        derivs = get_derivatives(0, np.array([7000, 0, 0, 0, 7, 0]))
+
+        self.assertEqual(derivs.dtype, np.float64,
+                         msg="An integer state must produce float64 derivatives.")
+        self.assertAlmostEqual(derivs[3], -GM_EARTH / 7000.0**2, places=4,
+                               msg="The compiled path must not truncate the acceleration of an integer state.")
+
     #TESTE BÁSICO PARA runge_kutta_4 (Teste de Estabilidade/Movimento)
         def test_rk4_propagation_consistency(self):
             time_series, state_history = runge_kutta_4(self.state_test, self.delta_t, self.num_steps)
@@ -59,5 +94,89 @@ class TestOrbitalMechanics(unittest.TestCase):
             self.assertTrue(position_difference > 10.0,
                             msg="The final state does not change significatively after the propagation.")
 
+    #TESTE PARA runge_kutta_4 com estado inválido (NaN deve se propagar, sem exceção)
+    def test_rk4_nan_state_returns_nan(self):
+        _, state_history = runge_kutta_4(np.full(6, np.nan), self.delta_t, 3)
+
+        self.assertTrue(np.isnan(state_history).all(),
+                        msg="A NaN initial state must produce an all-NaN history.")
+
+    #TESTE PARA runge_kutta_4_batch (Cada linha do lote deve reproduzir o histórico individual)
+    def test_rk4_batch_history_matches_single(self):
+        states_initial = np.array([self.state_test, [0.0, 6800.0, 1200.0, -7.0, 0.0, 2.0]])
+
+        time_series, state_history = runge_kutta_4_batch(states_initial, self.delta_t, self.num_steps)
+
+        self.assertEqual(state_history.shape, (2, self.num_steps + 1, 6),
+                         msg="The batched history must have shape (N, num_steps + 1, 6)")
+        for state_initial, history in zip(states_initial, state_history):
+            _, history_single = runge_kutta_4(state_initial, self.delta_t, self.num_steps)
+            np.testing.assert_allclose(history, history_single, rtol=1e-12,
+                                       err_msg="The batched RK4 history differs from runge_kutta_4.")
+        self.assertAlmostEqual(time_series[-1], self.num_steps * self.delta_t, places=5)
+
+    #TESTE PARA os kernels em lote com um satélite inválido (a linha NaN não contamina as demais)
+    def test_batch_nan_row_returns_nan(self):
+        states_initial = np.array([self.state_test, np.full(6, np.nan)])
+        _, reference = runge_kutta_4(self.state_test, self.delta_t, self.num_steps)
+
+        for propagate in (runge_kutta_4_batch, dopri5_j2_batch):
+            _, state_history = propagate(states_initial, self.delta_t, self.num_steps)
+
+            self.assertTrue(np.isnan(state_history[1]).all(),
+                            msg=f"{propagate.__name__}: a NaN row must produce an all-NaN history.")
+            self.assertTrue(np.isfinite(state_history[0]).all(),
+                            msg=f"{propagate.__name__}: the valid row must stay finite.")
+        np.testing.assert_allclose(runge_kutta_4_batch(states_initial, self.delta_t, self.num_steps)[1][0],
+                                   reference, rtol=1e-12, err_msg="A NaN row changes the other histories.")
+
+    #TESTE PARA include_j2=False (Sem J2 a componente z do momento angular deve se conservar)
+    def test_rk4_without_j2_conserves_angular_momentum(self):
+        state_initial = np.array([7000.0, 0.0, 1000.0, 0.0, 7.0, 3.0])
+
+        _, state_history = runge_kutta_4(state_initial, self.delta_t, 100, include_j2=False)
+
+        h_initial = np.cross(state_history[0, 0:3], state_history[0, 3:6])
+        h_final = np.cross(state_history[-1, 0:3], state_history[-1, 3:6])
+        np.testing.assert_allclose(h_final, h_initial, rtol=1e-6,
+                                   err_msg="The two-body propagation does not conserve angular momentum.")
+
+    #TESTE PARA rk4_step_batch (Kernel Numba deve reproduzir o RK4 de referência)
+    def test_rk4_step_batch_matches_reference(self):
+        _, state_history = runge_kutta_4(self.state_test, self.delta_t, self.num_steps)
+
+        states = np.array([self.state_test, self.state_test])
+        rk4_step_batch(states, self.delta_t, self.num_steps)
+
+        for row in states:
+            np.testing.assert_allclose(row, state_history[-1], rtol=1e-10,
+                                       err_msg="The compiled RK4 kernel diverges from runge_kutta_4.")
+
+    #TESTE PARA dopri5_propagate_batch (Passo adaptativo deve convergir para o RK4 de passo fino)
+    def test_dopri5_matches_fine_rk4(self):
+        reference = np.array([self.state_test])
+        rk4_step_batch(reference, 1.0, 600)
+
+        states = np.array([self.state_test])
+        dt_sat = np.array([self.delta_t])
+        dopri5_propagate_batch(states, dt_sat, 600.0, 1e-10)
+
+        np.testing.assert_allclose(states, reference, rtol=1e-8,
+                                   err_msg="The adaptive DOPRI5 kernel diverges from fine-step RK4.")
+        self.assertTrue(dt_sat[0] > 0.0, msg="The suggested step size must stay positive.")
+
+    #TESTE PARA dopri5_j2 (Histórico interpolado na grade fixa deve seguir o RK4 de passo fino)
+    def test_dopri5_j2_dense_output_matches_fine_rk4(self):
+        _, reference = runge_kutta_4(self.state_test, 1.0, int(self.num_steps * self.delta_t))
+
+        time_series, state_history = dopri5_j2(self.state_test, self.delta_t, self.num_steps,
+                                               atol=1e-12, rtol=1e-12)
+
+        self.assertEqual(state_history.shape, (self.num_steps + 1, 6),
+                         msg="The DOPRI5 history must have one row per output time")
+        self.assertAlmostEqual(time_series[-1], self.num_steps * self.delta_t, places=5)
+        np.testing.assert_allclose(state_history, reference[::int(self.delta_t)], rtol=1e-8, atol=1e-8,
+                                   err_msg="The DOPRI5 dense output diverges from fine-step RK4.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from skyfield.api import load, EarthSatellite
+from src.data_handler import get_sgp4_states_batch
+from src.simulation import run_multi_object_simulation_and_validate, NUM_STEPS, DELTA_T_SECONDS
+
+# TLE real da ISS e um "gêmeo" fictício (outro número NORAD, mesmo plano defasado em
+# RAAN e anomalia média), ambos na mesma época
+ISS_LINE1 = '1 25544U 98067A   14020.93268519  .00009878  00000-0  18200-3 0  5082'
+ISS_LINE2 = '2 25544  51.6498 109.4756 0003572  55.9686 274.8005 15.49815350868473'
+TWIN_LINE1 = '1 99999U 98067B   14020.93268519  .00009878  00000-0  18200-3 0  5087'
+TWIN_LINE2 = '2 99999  51.6498 289.4756 0003572  55.9686  94.8005 15.49815350868477'
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        self.ts = load.timescale()
+        self.satellites = [EarthSatellite(ISS_LINE1, ISS_LINE2, 'ISS (ZARYA)', self.ts),
+                           EarthSatellite(TWIN_LINE1, TWIN_LINE2, 'TWIN', self.ts)]
+        self.rows_per_satellite = NUM_STEPS + 1
+
+    def run_simulation(self, **kwargs):
+        # Silencia o progresso impresso por satélite
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_multi_object_simulation_and_validate(self.ts, self.satellites, **kwargs)
+
+    #TESTE PARA run_multi_object_simulation_and_validate (Uma única tabela para a frota inteira)
+    def test_single_dataframe_layout(self):
+        df = self.run_simulation()
+
+        self.assertEqual(len(df), len(self.satellites) * self.rows_per_satellite,
+                         msg="The table must have one row per (satellite, time step).")
+        self.assertIsInstance(df['satellite_name'].dtype, pd.CategoricalDtype,
+                              msg="The satellite names must be stored as a categorical column.")
+        self.assertEqual(df['satellite_name'].cat.categories.tolist(), ['ISS (ZARYA)', 'TWIN'])
+        for column in ('rx', 'ry', 'rz', 'vx', 'vy', 'vz'):
+            self.assertEqual(df[column].dtype, np.float32,
+                             msg=f"The state column '{column}' must be stored as float32.")
+
+        iss = df[df['satellite_id'] == 25544]
+        self.assertTrue((iss['satellite_name'] == 'ISS (ZARYA)').all(),
+                        msg="Each satellite's rows must keep their own name.")
+        np.testing.assert_array_equal(iss['time_step'], np.arange(self.rows_per_satellite) * DELTA_T_SECONDS)
+        self.assertEqual(iss['error_km'].nunique(), 1,
+                         msg="The final error must be repeated on every row of a satellite.")
+        self.assertTrue(np.isfinite(df['error_km']).all() and (df['error_km'] < 5.0).all(),
+                        msg="The one-hour error against SGP4 must stay below a few km.")
+
+    #TESTE PARA validate_full_trajectory (Erro em cada passo, coerente com o erro final)
+    def test_full_trajectory_adds_step_error(self):
+        df = self.run_simulation()
+        df_full = self.run_simulation(validate_full_trajectory=True)
+
+        self.assertNotIn('step_error_km', df.columns,
+                         msg="The step error must only be computed when requested.")
+        self.assertIn('step_error_km', df_full.columns)
+        for _, rows in df_full.groupby('satellite_id'):
+            step_error = rows['step_error_km'].to_numpy()
+            self.assertAlmostEqual(step_error[0], 0.0, places=3,
+                                   msg="The step error must start at zero (same initial state).")
+            self.assertAlmostEqual(step_error[-1], rows['error_km'].iloc[-1], places=3,
+                                   msg="The last step error must match the final error.")
+        np.testing.assert_allclose(df_full['error_km'], df['error_km'], rtol=1e-12,
+                                   err_msg="The full validation changes the final error.")
+
+    #TESTE PARA SIMULATION_FRAME (A trajetória parte do estado SGP4 no referencial TEME)
+    def test_initial_state_in_teme(self):
+        df = self.run_simulation()
+
+        t_epoch = self.ts.tt_jd(np.array([self.satellites[0].epoch.tt]))
+        r_teme, v_teme = get_sgp4_states_batch(self.satellites, t_epoch, 'teme')
+        initial_rows = df[df['time_step'] == 0]
+        np.testing.assert_allclose(initial_rows[['rx', 'ry', 'rz']], r_teme[:, 0, :], rtol=1e-6,
+                                   err_msg="The initial positions must be the SGP4 state in TEME.")
+        np.testing.assert_allclose(initial_rows[['vx', 'vy', 'vz']], v_teme[:, 0, :], rtol=1e-6,
+                                   err_msg="The initial velocities must be the SGP4 state in TEME.")
+
+    #TESTE PARA integrator='dopri5' (Mesma grade de saída, perto do RK4)
+    def test_dopri5_integrator_matches_rk4(self):
+        df_rk4 = self.run_simulation()
+        df_dopri5 = self.run_simulation(integrator='dopri5')
+
+        self.assertEqual(len(df_dopri5), len(df_rk4),
+                         msg="DOPRI5 must write the history on the same output grid as RK4.")
+        np.testing.assert_allclose(df_dopri5[['rx', 'ry', 'rz']], df_rk4[['rx', 'ry', 'rz']], atol=0.1,
+                                   err_msg="The DOPRI5 trajectory diverges from RK4.")
+
+    def test_invalid_integrator_raises(self):
+        with self.assertRaises(ValueError):
+            self.run_simulation(integrator='euler')
+
+if __name__ == '__main__':
+    unittest.main()